@@ -1,32 +1,48 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import threading
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-import numpy as np
+import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
-from src.music_game.audio.input import ChordPrediction
-from src.music_game.game.common import GameConfig, GameResult
-from src.music_game.game.engine import MusicEmotionGame
+if TYPE_CHECKING:
+    from src.music_game.game.common import GameResult
+    from src.music_game.game.engine import MusicEmotionGame
 
 load_dotenv()
 
 APP_TITLE = "Music Emotion Detector"
-SUPPORTED_AUDIO_TYPES = ["audio/wav", "audio/x-wav", "audio/mpeg", "audio/ogg", "audio/webm"]
-SUPPORTED_MIDI_TYPES = ["audio/midi", "audio/x-midi", "application/octet-stream"]
+SUPPORTED_AUDIO_TYPES = frozenset({"audio/wav", "audio/x-wav", "audio/mpeg", "audio/ogg", "audio/webm"})
+SUPPORTED_MIDI_TYPES = frozenset({"audio/midi", "audio/x-midi", "application/octet-stream"})
+AUDIO_SUFFIXES = frozenset({".wav", ".mp3", ".ogg", ".webm"})
+MIDI_SUFFIXES = frozenset({".mid", ".midi"})
+# Formats libsndfile decodes straight from the upload buffer; anything else goes through a temp file.
+IN_MEMORY_AUDIO_SUFFIXES = frozenset({".wav", ".ogg"})
 
 
 @st.cache_resource
 def load_game() -> MusicEmotionGame:
+    """Build the process-wide game once per server.
+
+    Its Ollama client uses the shared per-host connection pool, which llm.dialogue closes at interpreter exit.
+    """
+    # Imported here so librosa/torch load behind the cache instead of before the UI first paints.
+    from src.music_game.game.common import GameConfig
+    from src.music_game.game.engine import MusicEmotionGame
+
     config_path = Path("config/app_settings.yaml")
     config = GameConfig.from_file(config_path) if config_path.exists() else GameConfig()
     model_path = os.getenv("EMOTION_MODEL_PATH")
     ollama_host = os.getenv("OLLAMA_HOST")
-    return MusicEmotionGame(config=config, emotion_model_path=model_path, ollama_base_url=ollama_host)
+    game = MusicEmotionGame(config=config, emotion_model_path=model_path, ollama_base_url=ollama_host)
+    # Warm the Ollama connection pool off the render path so the first chord skips the connect cost.
+    threading.Thread(target=game.ollama.prewarm, daemon=True).start()
+    return game
 
 
 def main() -> None:
@@ -34,8 +50,6 @@ def main() -> None:
     st.title(APP_TITLE)
     st.caption("Play music, feel the emotion, hear the response.")
 
-    game = load_game()
-
     uploaded = st.file_uploader(
         "Upload a song recording (WAV/MP3/OGG) or MIDI file",
         type=["wav", "mp3", "ogg", "midi", "mid"],
@@ -52,9 +66,10 @@ def main() -> None:
         placeholder = st.empty()
     with col2: 
         st.header("Chord & Emotion")
-        chord_placeholder = st.empty()
-        key_placeholder = st.empty()
-        emotion_placeholder = st.empty()
+        stats_placeholder = st.empty()
+
+    # Load after the layout is sent so the page paints before the model and engine import.
+    game = load_game()
 
     if uploaded is None and audio_input is None:
         placeholder.info("Upload an audio or MIDI file or record audio to generate dialogue.")
@@ -64,8 +79,8 @@ def main() -> None:
 
     if file_to_process:
         # Playback the input audio (skip MIDI)
-        is_midi = hasattr(file_to_process, "name") and file_to_process.name.lower().endswith((".mid", ".midi"))
-        if not is_midi:
+        suffix = Path(getattr(file_to_process, "name", "")).suffix.lower()
+        if suffix not in MIDI_SUFFIXES:
             st.audio(file_to_process)
 
     result = _handle_upload(game, file_to_process)
@@ -73,7 +88,7 @@ def main() -> None:
         placeholder.warning("Could not decode the submission. Try another file.")
         return
 
-    _render_result(placeholder, chord_placeholder, key_placeholder, emotion_placeholder, result)
+    _render_result(game, placeholder, stats_placeholder, result)
 
 
 def _handle_upload(game: MusicEmotionGame, uploaded_file) -> Optional[GameResult]:  # type: ignore[no-untyped-def]
@@ -86,61 +101,79 @@ def _handle_upload(game: MusicEmotionGame, uploaded_file) -> Optional[GameResult
 
     suffix = Path(uploaded_file.name).suffix.lower()
     media_type = uploaded_file.type.lower() if uploaded_file.type else ""
-
-    with NamedTemporaryFile(suffix=suffix, delete=False) as temp:
-        temp.write(uploaded_file.read())
-        temp_path = Path(temp.name)
+    with uploaded_file.getbuffer() as view:
+        digest = hashlib.blake2b(view, digest_size=16).hexdigest()
 
     try:
-        if media_type in SUPPORTED_MIDI_TYPES or suffix in {".midi", ".mid"}:
-            return game.process_midi_file(temp_path)
-        
-        # Broader check for audio types
-        if (
-            media_type in SUPPORTED_AUDIO_TYPES 
-            or suffix in {".wav", ".mp3", ".ogg", ".webm"} 
-            or media_type.startswith("audio/")
-        ):
-            return game.process_audio_file(temp_path)
-            
+        return _process_upload(digest, suffix, media_type, game, uploaded_file)
     except Exception as e:
         st.error(f"Error processing audio file: {e}")
         return None
-    finally:
-        try:
-            temp_path.unlink()
-        except FileNotFoundError:
-            pass
 
-    return None
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def _process_upload(digest: str, suffix: str, media_type: str, _game: MusicEmotionGame, _uploaded_file) -> Optional[GameResult]:  # type: ignore[no-untyped-def]
+    """Analyse an upload once per content digest; reruns reuse the cached result.
+
+    Dialogue is streamed separately at render time, so the cached result carries no side effects.
+    """
+    is_midi = media_type in SUPPORTED_MIDI_TYPES or suffix in MIDI_SUFFIXES
+    # Broader check for audio types
+    is_audio = media_type in SUPPORTED_AUDIO_TYPES or suffix in AUDIO_SUFFIXES or media_type.startswith("audio/")
+    if not is_midi and not is_audio:
+        return None
+
+    if not is_midi and suffix in IN_MEMORY_AUDIO_SUFFIXES:
+        _uploaded_file.seek(0)
+        return _game.process_audio_file(_uploaded_file, defer_dialogue=True)
+
+    from src.music_game.audio.input import spill_to_temp_file
+
+    # The context removes the copied upload on exit, including on errors.
+    with spill_to_temp_file(_uploaded_file, suffix) as temp_path:
+        if is_midi:
+            return _game.process_midi_file(temp_path, defer_dialogue=True)
+        return _game.process_audio_file(temp_path, defer_dialogue=True)
 
-def _render_result(placeholder, chord_placeholder, key_placeholder, emotion_placeholder, result: GameResult) -> None:  # type: ignore[no-untyped-def]
+
+def _render_result(game: MusicEmotionGame, placeholder, stats_placeholder, result: GameResult) -> None:  # type: ignore[no-untyped-def]
     chord_label = result.chord.label if result.chord else "Unknown"
     key_label = result.key.label if result.key else "Unknown"
     emotion_label = result.emotion.label if result.emotion else "Undetermined"
 
+    # Emit the metrics as one container so the browser receives a single delta tree,
+    # and paint them before the dialogue stream starts.
+    with stats_placeholder.container():
+        st.metric(label="Chord", value=chord_label)
+        st.metric(label="Key", value=key_label)
+        if result.emotion:
+            st.metric(label="Emotion", value=emotion_label, delta=f"{result.emotion.confidence:.2f}")
+        else:
+            st.metric(label="Emotion", value=emotion_label)
+
+    with st.container():
+        if result.emotion:
+            st.bar_chart(pd.Series(result.emotion.probabilities, dtype=float))
+
+        if result.chord_sequence:
+            st.subheader("Chord Progression")
+            # Format as a simple timeline table, building columns rather than one dict per row
+            times, chords = zip(*result.chord_sequence)
+            sequence_data = pd.DataFrame({"Time": [f"{t:.1f}s" for t in times], "Chord": list(chords)})
+            st.dataframe(sequence_data, use_container_width=True)
+
     if result.dialogue:
         placeholder.success(result.dialogue.content)
+    elif result.chord and result.emotion:
+        # Paint tokens as Ollama emits them instead of waiting for the full completion.
+        try:
+            placeholder.write_stream(game.stream_dialogue(result))
+        except Exception as e:
+            placeholder.error(f"Error generating dialogue: {e}")
     else:
         placeholder.info("No dialogue generated for this chord yet.")
-
-    chord_placeholder.metric(label="Chord", value=chord_label)
-    key_placeholder.metric(label="Key", value=key_label)
-
-    if result.emotion:
-        emotion_placeholder.metric(label="Emotion", value=emotion_label, delta=f"{result.emotion.confidence:.2f}")
-        probs = result.emotion.probabilities
-        chart_data = {label: value for label, value in probs.items()}
-        st.bar_chart(chart_data)
-
-    if result.chord_sequence:
-        st.subheader("Chord Progression")
-        # Format as a simple timeline string or table
-        sequence_data = [{"Time": f"{t:.1f}s", "Chord": c} for t, c in result.chord_sequence]
-        st.dataframe(sequence_data, use_container_width=True)
-    else:
-        emotion_placeholder.metric(label="Emotion", value=emotion_label)
+        # stream_dialogue() is skipped here, so send the analysis to Unreal directly.
+        game.notify_unreal(result)
 
 
 if __name__ == "__main__":
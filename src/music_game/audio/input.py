@@ -1,18 +1,23 @@
 from __future__ import annotations
 
+import shutil
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence, Tuple
+from tempfile import TemporaryDirectory
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import librosa
 import mido
 import numpy as np
+import soundfile as sf
 
 NOTE_NAMES: Tuple[str, ...] = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
 _MAJOR_TEMPLATE = np.array([1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0])
 _MINOR_TEMPLATE = np.array([1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0])
 _AUGMENTED_TEMPLATE = np.array([1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0])
 _DIMINISHED_TEMPLATE = np.array([1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+_SPILL_CHUNK_SIZE = 1024 * 1024
 
 
 @dataclass
@@ -34,10 +39,31 @@ class ChordPrediction:
         return f"{self.root} {self.quality}"
 
 
-def load_audio_samples(file_path: str | Path, sample_rate: int = 22050) -> tuple[np.ndarray, int]:
-    """Load mono audio samples resampled to the requested rate."""
-    samples, sr = librosa.load(Path(file_path).expanduser().resolve().as_posix(), sr=sample_rate, mono=True)
-    return samples, sr
+@contextmanager
+def spill_to_temp_file(file_obj: BinaryIO, suffix: str = "") -> Iterator[Path]:
+    """Copy a binary file object to a temporary path, removed when the context exits."""
+    with TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir) / f"upload{suffix}"
+        file_obj.seek(0)
+        with temp_path.open("wb") as temp:
+            shutil.copyfileobj(file_obj, temp, length=_SPILL_CHUNK_SIZE)
+        yield temp_path
+
+
+def load_audio_samples(file_path: str | Path | BinaryIO, sample_rate: int = 22050) -> tuple[np.ndarray, int]:
+    """Load mono audio samples resampled to the requested rate.
+
+    Accepts a path or an open binary file object; the latter is decoded in memory by soundfile.
+    """
+    if isinstance(file_path, (str, Path)):
+        return librosa.load(Path(file_path).expanduser().resolve().as_posix(), sr=sample_rate, mono=True)
+
+    try:
+        return librosa.load(file_path, sr=sample_rate, mono=True)
+    except sf.SoundFileRuntimeError:
+        # librosa only falls back to audioread/ffmpeg for paths, so spill the buffer to disk and retry.
+        with spill_to_temp_file(file_path, Path(getattr(file_path, "name", "")).suffix) as temp_path:
+            return librosa.load(temp_path.as_posix(), sr=sample_rate, mono=True)
 
 
 def compute_chroma(samples: np.ndarray, sample_rate: int, hop_length: int = 512) -> np.ndarray:
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import BinaryIO, Dict, Hashable, Iterator, List, Optional, Tuple
 
 from ..audio.analysis import extract_essentia_descriptors
 from ..audio.input import (
@@ -15,10 +17,13 @@ from ..audio.input import (
     load_audio_samples,
 )
 from ..emotion.model import EmotionClassifier, EmotionPrediction, FEATURE_KEYS
-from ..llm.dialogue import DEFAULT_BASE_URL, DialogueTurn, OllamaClient
+from ..llm.dialogue import DEFAULT_BASE_URL, FALLBACK_REPLY, DialogueTurn, OllamaClient
 from .common import GameConfig, GameResult
 from .unreal_client import UnrealClient
 
+# Number of distinct chord/emotion responses kept in memory across reruns and sessions.
+DIALOGUE_CACHE_SIZE = 128
+
 
 class MusicEmotionGame:
     def __init__(
@@ -34,12 +39,15 @@ class MusicEmotionGame:
             model_path=emotion_model_path,
         )
         self.ollama = OllamaClient(base_url=ollama_base_url or DEFAULT_BASE_URL, model=config.ollama_model)
+        self._dialogue_cache: OrderedDict[Tuple[Hashable, ...], DialogueTurn] = OrderedDict()
+        # The game is shared by every Streamlit session, so cache reads and evictions must not interleave.
+        self._dialogue_cache_lock = threading.Lock()
         
         self.unreal_client: Optional[UnrealClient] = None
         if config.unreal_enabled:
             self.unreal_client = UnrealClient(ip=config.unreal_ip, port=config.unreal_port)
 
-    def process_audio_file(self, file_path: str | Path) -> GameResult:
+    def process_audio_file(self, file_path: str | Path | BinaryIO, defer_dialogue: bool = False) -> GameResult:
         samples, sr = load_audio_samples(file_path, sample_rate=self.config.sample_rate)
         chroma = compute_chroma(samples, sr, hop_length=self.config.hop_length)
         chord = estimate_chord(chroma)
@@ -75,15 +83,16 @@ class MusicEmotionGame:
                 
             emotion = EmotionPrediction(label=fallback_label, confidence=0.6, probabilities={})
         
-        dialogue = self._generate_dialogue(chord, key, emotion, descriptors)
+        # When deferred, the caller produces dialogue via stream_dialogue() or calls notify_unreal() itself.
+        dialogue = None if defer_dialogue else self._generate_dialogue(chord, key, emotion, descriptors)
         result = GameResult(chord=chord, key=key, emotion=emotion, descriptors=descriptors, dialogue=dialogue, chord_sequence=chord_sequence)
         
-        if self.unreal_client:
+        if self.unreal_client and not defer_dialogue:
             self.unreal_client.send_game_result(result)
             
         return result
 
-    def process_midi_file(self, file_path: str | Path) -> GameResult:
+    def process_midi_file(self, file_path: str | Path, defer_dialogue: bool = False) -> GameResult:
         chroma = derive_chroma_from_midi(file_path)
         chord = estimate_chord(chroma) if chroma is not None else None
         key = estimate_key(chroma) if chroma is not None else None
@@ -111,14 +120,52 @@ class MusicEmotionGame:
                 
             emotion = EmotionPrediction(label=fallback_label, confidence=0.6, probabilities={})
 
-        dialogue = self._generate_dialogue(chord, key, emotion, descriptors)
+        dialogue = None if defer_dialogue else self._generate_dialogue(chord, key, emotion, descriptors)
         result = GameResult(chord=chord, key=key, emotion=emotion, descriptors=descriptors, dialogue=dialogue)
         
-        if self.unreal_client:
+        if self.unreal_client and not defer_dialogue:
             self.unreal_client.send_game_result(result)
             
         return result
 
+    def stream_dialogue(self, result: GameResult) -> Iterator[str]:
+        """Yield dialogue fragments for a result produced with ``defer_dialogue=True``.
+
+        Once the stream is exhausted the full turn is stored on ``result.dialogue``
+        and recorded in the history, mirroring the non-streaming path. Unreal is
+        notified however the stream ends, including when a rerun cuts it short.
+        """
+        try:
+            if not result.chord or not result.emotion:
+                return
+
+            cache_key = self._dialogue_key(result.chord, result.key, result.emotion, result.descriptors)
+            cached = self._cached_dialogue(cache_key)
+            if cached is not None:
+                yield cached.content
+                result.dialogue = cached
+                # Reruns replay the same cached result; don't fill the history with copies of one reply.
+                if not self.history or self.history[-1] != cached:
+                    self._remember(cached)
+                return
+
+            result.dialogue = yield from self.ollama.generate_stream(
+                emotion_label=result.emotion.label,
+                chord_label=result.chord.label,
+                key_label=result.key.label if result.key else None,
+                descriptors=result.descriptors,
+                history=self.history,
+            )
+            self._store_dialogue(cache_key, result.dialogue)
+            self._remember(result.dialogue)
+        finally:
+            self.notify_unreal(result)
+
+    def notify_unreal(self, result: GameResult) -> None:
+        """Send a result to Unreal Engine when the bridge is enabled."""
+        if self.unreal_client:
+            self.unreal_client.send_game_result(result)
+
     def _infer_emotion(self, descriptors: Dict[str, float | str]) -> Optional[EmotionPrediction]:
         numeric_features = {key: float(descriptors.get(key, 0.0)) for key in FEATURE_KEYS}
         prediction = self.emotion_classifier.predict(numeric_features)
@@ -136,15 +183,55 @@ class MusicEmotionGame:
         if not chord or not emotion:
             return None
 
-        chord_label = chord.label
-        key_label = key.label if key else None
-        turn = self.ollama.generate(
-            emotion_label=emotion.label,
-            chord_label=chord_label,
-            key_label=key_label,
-            descriptors=descriptors,
-            history=self.history,
+        cache_key = self._dialogue_key(chord, key, emotion, descriptors)
+        turn = self._cached_dialogue(cache_key)
+        if turn is None:
+            chord_label = chord.label
+            key_label = key.label if key else None
+            turn = self.ollama.generate(
+                emotion_label=emotion.label,
+                chord_label=chord_label,
+                key_label=key_label,
+                descriptors=descriptors,
+                history=self.history,
+            )
+            self._store_dialogue(cache_key, turn)
+        self._remember(turn)
+        return turn
+
+    def _dialogue_key(
+        self,
+        chord: ChordPrediction,
+        key: Optional[ChordPrediction],
+        emotion: EmotionPrediction,
+        descriptors: Dict[str, float | str],
+    ) -> Tuple[Hashable, ...]:
+        # History is deliberately left out so identical chord/emotion inputs reuse one response.
+        return (
+            emotion.label,
+            chord.label,
+            key.label if key else None,
+            tuple(sorted(descriptors.items())),
+            self.ollama.model,
         )
+
+    def _cached_dialogue(self, cache_key: Tuple[Hashable, ...]) -> Optional[DialogueTurn]:
+        with self._dialogue_cache_lock:
+            turn = self._dialogue_cache.get(cache_key)
+            if turn is not None:
+                self._dialogue_cache.move_to_end(cache_key)
+            return turn
+
+    def _store_dialogue(self, cache_key: Tuple[Hashable, ...], turn: DialogueTurn) -> None:
+        # Failed or empty replies are transient, so they are never cached.
+        if turn.failed or turn.content == FALLBACK_REPLY:
+            return
+        with self._dialogue_cache_lock:
+            self._dialogue_cache[cache_key] = turn
+            self._dialogue_cache.move_to_end(cache_key)
+            while len(self._dialogue_cache) > DIALOGUE_CACHE_SIZE:
+                self._dialogue_cache.popitem(last=False)
+
+    def _remember(self, turn: DialogueTurn) -> None:
         self.history.append(turn)
         self.history = self.history[-self.config.history_limit :]
-        return turn
@@ -1,19 +1,47 @@
 from __future__ import annotations
 
+import atexit
 import os
+import threading
 from dataclasses import dataclass
-from typing import Iterable, List, Optional
+from typing import Dict, Generator, Iterable, List, Optional
 
 import httpx
+import orjson
 
 DEFAULT_BASE_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
 DEFAULT_MODEL = os.environ.get("OLLAMA_MODEL", "llama3")
+# Most recent dialogue turns included in a prompt. Older turns are dropped so prefill cost
+# stays bounded over a long session, at the price of the model forgetting early replies.
+MAX_TURNS = 8
+# Reply used when Ollama answers successfully but with no text.
+FALLBACK_REPLY = "I need more data to respond."
+
+# Fixed instruction scaffold; only the named fields change between calls.
+PROMPT_TEMPLATE = (
+    "You are the in-game for an interactive music-driven emotion responder, analyses all chord progressions and given the response of the whole song.\n"
+    "Craft a reacting to the player's latest key.\n"
+    "{key_info}"
+    "Predicted emotion: {emotion}.\n"
+    "Audio descriptors:\n"
+    "{descriptors}\n"
+    "Previous dialogue (most recent last):\n"
+    "{context}\n"
+    "Respond with empathetic, emotionally supportive words, as if from a deeply attentive partner. (min 2 sentences)."
+)
+
+# One pooled client per Ollama host, shared by every OllamaClient and script-runner thread.
+# httpx.Client is safe for concurrent requests; the lock only guards first construction.
+_SHARED_CLIENTS: Dict[str, httpx.Client] = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
 
 
 @dataclass
 class DialogueTurn:
     role: str
     content: str
+    # Set when the turn carries an error message (or a reply cut short by one) rather than a full reply.
+    failed: bool = False
 
 
 class OllamaClient:
@@ -22,6 +50,17 @@ class OllamaClient:
         self.model = model
         self.timeout = timeout
 
+    @property
+    def _client(self) -> httpx.Client:
+        return _shared_http_client(self.base_url)
+
+    def prewarm(self) -> None:
+        """Open a pooled connection ahead of the first dialogue request."""
+        try:
+            self._client.get("/api/tags", timeout=self.timeout)
+        except httpx.RequestError:
+            pass
+
     def generate(
         self,
         emotion_label: str,
@@ -36,26 +75,118 @@ class OllamaClient:
             "stream": False,
         }
 
-        with httpx.Client(timeout=self.timeout) as client:
-            try:
-                response = client.post(f"{self.base_url}/api/generate", json=payload)
-                response.raise_for_status()
-                data = response.json()
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 404:
-                    return DialogueTurn(
-                        role="assistant",
-                        content=f"Error: Model '{self.model}' not found. Please ensure it is pulled in Ollama (e.g., `ollama pull {self.model}`).",
-                    )
-                raise e
-            except httpx.RequestError:
+        try:
+            response = self._client.post("/api/generate", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
                 return DialogueTurn(
                     role="assistant",
-                    content="Error: Could not connect to Ollama. Is the service running?",
+                    content=f"Error: Model '{self.model}' not found. Please ensure it is pulled in Ollama (e.g., `ollama pull {self.model}`).",
+                    failed=True,
                 )
+            raise e
+        except httpx.RequestError:
+            return DialogueTurn(
+                role="assistant",
+                content="Error: Could not connect to Ollama. Is the service running?",
+                failed=True,
+            )
 
-        content = data.get("response") or data.get("text") or "I need more data to respond."
-        return DialogueTurn(role="assistant", content=content.strip())
+        # /api/generate always answers in the "response" field.
+        content = (data.get("response") or "").strip() or FALLBACK_REPLY
+        return DialogueTurn(role="assistant", content=content)
+
+    def generate_stream(
+        self,
+        emotion_label: str,
+        chord_label: str,
+        key_label: Optional[str] = None,
+        descriptors: Optional[dict[str, float | str]] = None,
+        history: Optional[Iterable[DialogueTurn]] = None,
+    ) -> Generator[str, None, DialogueTurn]:
+        """Yield response fragments as Ollama emits them, then return the assembled turn.
+
+        Failures are yielded inline as an ``Error:`` fragment and flagged on the returned turn.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": _build_prompt(emotion_label, chord_label, key_label, descriptors, history),
+            "stream": True,
+        }
+
+        fragments: List[str] = []
+        error: Optional[str] = None
+        try:
+            with self._client.stream("POST", "/api/generate", json=payload, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = orjson.loads(line)
+                    # Ollama reports mid-stream failures as an "error" line on an HTTP 200 response.
+                    if data.get("error"):
+                        error = f"Error: {data['error']}"
+                        break
+                    fragment = data.get("response")
+                    if fragment:
+                        fragments.append(fragment)
+                        yield fragment
+                    if data.get("done"):
+                        break
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                error = f"Error: Model '{self.model}' not found. Please ensure it is pulled in Ollama (e.g., `ollama pull {self.model}`)."
+            else:
+                # The UI is already painting this stream, so report the failure inline instead of raising.
+                error = f"Error: Ollama returned HTTP {e.response.status_code}."
+        except httpx.RequestError:
+            error = "Error: Could not connect to Ollama. Is the service running?"
+        except orjson.JSONDecodeError:
+            error = "Error: Received a malformed response from Ollama."
+
+        if error is None:
+            content = "".join(fragments).strip()
+            if not content:
+                content = FALLBACK_REPLY
+                yield content
+            return DialogueTurn(role="assistant", content=content)
+
+        # Keep any partial reply readable by separating the error from it.
+        error_fragment = f"\n\n{error}" if fragments else error
+        fragments.append(error_fragment)
+        yield error_fragment
+        return DialogueTurn(role="assistant", content="".join(fragments).strip(), failed=True)
+
+
+def close_shared_clients() -> None:
+    """Close every pooled Ollama connection; registered to run at interpreter exit."""
+    with _SHARED_CLIENTS_LOCK:
+        clients = list(_SHARED_CLIENTS.values())
+        _SHARED_CLIENTS.clear()
+    for client in clients:
+        if not client.is_closed:
+            client.close()
+
+
+atexit.register(close_shared_clients)
+
+
+def _shared_http_client(base_url: str) -> httpx.Client:
+    client = _SHARED_CLIENTS.get(base_url)
+    if client is not None and not client.is_closed:
+        return client
+
+    with _SHARED_CLIENTS_LOCK:
+        client = _SHARED_CLIENTS.get(base_url)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                base_url=base_url,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            )
+            _SHARED_CLIENTS[base_url] = client
+        return client
 
 
 def _build_prompt(
@@ -65,29 +196,18 @@ def _build_prompt(
     descriptors: Optional[dict[str, float | str]],
     history: Optional[Iterable[DialogueTurn]],
 ) -> str:
-    dialogue_context: List[str] = []
-    if history:
-        for turn in history:
-            dialogue_context.append(f"{turn.role.title()}: {turn.content}")
-
-    descriptor_lines: List[str] = []
-    if descriptors:
-        for key, value in descriptors.items():
-            descriptor_lines.append(f"- {key}: {value}")
-
-    descriptor_block = "\n".join(descriptor_lines) if descriptor_lines else "- No detailed descriptors"
-    context_block = "\n".join(dialogue_context)
+    turns = list(history)[-MAX_TURNS:] if history else []
+    context_block = "\n".join(f"{turn.role.title()}: {turn.content}" for turn in turns)
+    descriptor_block = (
+        "\n".join(f"- {key}: {value}" for key, value in descriptors.items())
+        if descriptors
+        else "- No detailed descriptors"
+    )
     key_info = f"Detected key: {key_label}.\n" if key_label else ""
 
-    return (
-        "You are the in-game for an interactive music-driven emotion responder, analyses all chord progressions and given the response of the whole song.\n"
-        "Craft a reacting to the player's latest key.\n"
-        f"Detected key: {key_label}.\n"
-        f"{key_info}"
-        f"Predicted emotion: {emotion_label}.\n"
-        "Audio descriptors:\n"
-        f"{descriptor_block}\n"
-        "Previous dialogue (most recent last):\n"
-        f"{context_block}\n"
-        "Respond with empathetic, emotionally supportive words, as if from a deeply attentive partner. (min 2 sentences)."
+    return PROMPT_TEMPLATE.format(
+        key_info=key_info,
+        emotion=emotion_label,
+        descriptors=descriptor_block,
+        context=context_block,
     )